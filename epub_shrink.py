@@ -13,26 +13,37 @@ Options:
 """
 
 import argparse
+import functools
 import pathlib
 import shutil
 import sys
 import tempfile
+import threading
 import zipfile
 import subprocess
 import os
+import posixpath
 import datetime
+import re
 import uuid
 import html
 from urllib.parse import unquote, urlparse
 from collections import defaultdict
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from lxml import etree as ET
-from fnmatch import fnmatch
+from fnmatch import translate
 from PIL import Image
 from bs4 import BeautifulSoup, Doctype
 import tinycss2
 from tqdm import tqdm
 
+# Optional in-process oxipng bindings (pyoxipng); falls back to the CLI tool
+try:
+    import oxipng
+except ImportError:
+    oxipng = None
+
 # Define deprecated items and their substitutions for EPUB modernization
 DEPRECATED_ITEMS = {
     'tags': {
@@ -63,6 +74,42 @@ DEPRECATED_ITEMS = {
 
 TMP_ROOT = pathlib.Path(tempfile.gettempdir())
 
+# Attribute names that carry file references in XHTML/SVG content.
+# lxml expands namespaced attributes to '{uri}local', hence the '}' suffixes.
+REF_ATTRS = frozenset(('href', 'src', 'poster'))
+REF_ATTR_SUFFIXES = ('}href', '}src')
+
+# Images below this size are not worth a compressor round-trip: the possible
+# gain is a few hundred bytes while the tool/process overhead stays constant.
+MIN_COMPRESS_BYTES = 4096
+
+# Refs that can never resolve to a manifest entry: external schemes and
+# bare fragments. Colons keep this strict (a file named 'database.png' must
+# not match 'data').
+SKIP_REF_PREFIXES = ('http://', 'https://', 'data:', 'mailto:', 'javascript:', '#')
+
+# url(...) occurrences in inline style attributes, quoted or bare. Full
+# stylesheets still go through tinycss2 (for @import and nested rules), but
+# a style attribute is a flat declaration list that never needs the AST.
+# CSS function names are case-insensitive, hence the flag
+CSS_URL_RE = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)'"\s]+))\s*\)""",
+                        re.IGNORECASE)
+
+# Fast path over whole stylesheets: url() in any position plus the string
+# form of @import. Over-matching (e.g. inside comments) only keeps an extra
+# file; the tinycss2 fallback below covers stylesheets the regex can't read.
+# At-rule and function names are case-insensitive, hence the flag.
+CSS_REF_RE = re.compile(
+    r"""@import\s+(?:url\(\s*)?["']?([^"')\s;]+)"""
+    r"""|url\(\s*(?:"([^"]*)"|'([^']*)'|([^)'"\s]+))\s*\)""",
+    re.IGNORECASE
+)
+
+# Manifest entries always kept by reference analysis, regardless of whether
+# anything links to them. Constant set, so the union regex compiles once.
+ESSENTIAL_PATTERNS = ("*.ncx", "nav.xhtml", "*[Cc]ontents*", "*logo*", "META-INF/*")
+ESSENTIAL_RE = re.compile('|'.join(f'(?:{translate(p)})' for p in ESSENTIAL_PATTERNS))
+
 
 @dataclass
 class EpubContext:
@@ -72,29 +119,43 @@ class EpubContext:
     verbose: bool = False
     max_estimated_quality: int = 0
     weighted_avg_quality: float = None
+    # Per-image analysis results, keyed by path relative to the extract dir;
+    # source images never change between quality passes, so probe each once.
+    image_info_cache: dict = field(default_factory=dict)
+
+
 
+@functools.lru_cache(maxsize=None)
+def which_cached(cmd):
+    """shutil.which with the result cached; PATH doesn't change mid-run."""
+    return shutil.which(cmd)
 
 
 def verify_compressors_availability():
     """Check if required image compressors are available."""
-    if not shutil.which("jpegoptim"):
+    if not which_cached("jpegoptim"):
         print("Please install missing jpeg compressor jpegoptim for JPEG optimization")
         sys.exit(1)
-    
-    if not shutil.which("oxipng"):
+
+    if oxipng is None and not which_cached("oxipng"):
         print("Please install missing PNG compressor oxipng for PNG optimization")
         sys.exit(1)
 
-    if not shutil.which("pngquant"):
+    if not which_cached("pngquant"):
         print("Please install missing PNG compressor pngquant for lossy PNG optimization")
         sys.exit(1)
 
 
+HUMAN_UNITS = (('GB', 1 << 30), ('MB', 1 << 20), ('KB', 1 << 10))
+
+
 def human(n: int) -> str:
-    for unit in ('B', 'KB', 'MB', 'GB'):
-        if n < 1024 or unit == 'GB':
-            return f"{n:.1f} {unit}"
-        n /= 1024
+    # Single comparison chain and one division, instead of repeatedly
+    # dividing n on the way up through the units
+    for unit, divisor in HUMAN_UNITS:
+        if n >= divisor:
+            return f"{n / divisor:.1f} {unit}"
+    return f"{n:.1f} B"
 
 
 def parse_args():
@@ -124,7 +185,49 @@ def unzip(ctx: EpubContext):
     if ctx.extract_dir.exists():
         shutil.rmtree(ctx.extract_dir)
     ctx.extract_dir.mkdir()
-    zipfile.ZipFile(ctx.input_file).extractall(ctx.extract_dir)
+    extract_root = str(ctx.extract_dir.resolve())
+    with zipfile.ZipFile(ctx.input_file) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+
+    # Validate names and create directories up front, single-threaded
+    jobs = []
+    for info in infos:
+        # Members doomed by the default purge patterns never reach disk;
+        # the purge stage still scrubs their manifest/spine entries later
+        if DEFAULT_PURGE_RE.match(posixpath.basename(info.filename)):
+            continue
+        target = ctx.extract_dir / info.filename
+        # Guard against absolute or parent-relative member names
+        if not os.path.realpath(target).startswith(extract_root + os.sep):
+            print(f"Warning: Skipping unsafe zip member name: {info.filename}")
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append((info, target))
+
+    # A ZipFile handle is not safe for concurrent open() reads, so each
+    # worker thread keeps its own; the inflate streams then decompress in
+    # parallel (zlib releases the GIL) with no shared lock.
+    thread_state = threading.local()
+    handles = []
+
+    def extract_member(job):
+        info, target = job
+        zf = getattr(thread_state, 'zf', None)
+        if zf is None:
+            zf = thread_state.zf = zipfile.ZipFile(ctx.input_file)
+            handles.append(zf)
+        # Stream each member with a bounded buffer instead of extractall;
+        # 1 MiB chunks cut the Python-level read/write round trips ~64x
+        # versus copyfileobj's 16 KiB default on large images.
+        with zf.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+            list(pool.map(extract_member, jobs))
+    finally:
+        for zf in handles:
+            zf.close()
 
 
 def load_opf(ctx: EpubContext):
@@ -425,7 +528,6 @@ def convert_deprecated_attrs(soup):
     """Convert deprecated HTML attributes to inline CSS styles."""
     modified = False
     for tag in soup.find_all(True):
-        attrs_to_remove = []
         for attr in list(tag.attrs):
             if attr in DEPRECATED_ITEMS['attributes']:
                 val = tag[attr]
@@ -457,11 +559,9 @@ def convert_deprecated_attrs(soup):
                     else:
                         tag['style'] = style
                 
-                attrs_to_remove.append(attr)
+                # Iterating a snapshot, so deleting in place is safe
+                del tag[attr]
                 modified = True
-
-        for attr in attrs_to_remove:
-            del tag[attr]
     return modified
 
 
@@ -469,13 +569,10 @@ def remove_invalid_data_attrs(soup):
     """Remove invalid custom data attributes (e.g. data-* attributes with invalid characters)."""
     modified = False
     for tag in soup.find_all(True):
-        attrs_to_remove = []
         for attr in list(tag.attrs):
             if is_invalid_custom_data_attribute(attr):
-                attrs_to_remove.append(attr)
+                del tag[attr]
                 modified = True
-        for attr in attrs_to_remove:
-            del tag[attr]
     return modified
 
 
@@ -581,10 +678,13 @@ def modernize_ncx_and_tours(extract_dir, opf_root, ns):
 
 def modernize_cover_image_id(opf_root, manifest, ns):
     """Modernize cover image ID to satisfy Calibre & Nook Color compatibility."""
+    # Index items by id once instead of re-scanning manifest.values() per lookup
+    items_by_id = {item.get('id'): item for item in manifest.values() if item.get('id')}
+
     cover_item = None
     # Search cover image via EPUB 3 properties
     cover_item = next((item for item in manifest.values() if 'cover-image' in (item.get('properties') or '').split()), None)
-    
+
     # If not found, search cover image via EPUB 2 legacy cover metadata
     if cover_item is None:
         metadata = opf_root.find('opf:metadata', ns)
@@ -592,7 +692,7 @@ def modernize_cover_image_id(opf_root, manifest, ns):
             for meta in metadata.findall('.//opf:meta[@name="cover"]', ns):
                 c_id = meta.get('content')
                 if c_id:
-                    cover_item = next((item for item in manifest.values() if item.get('id') == c_id), None)
+                    cover_item = items_by_id.get(c_id)
                     if cover_item is not None:
                         break
 
@@ -600,12 +700,14 @@ def modernize_cover_image_id(opf_root, manifest, ns):
         old_cover_id = cover_item.get('id')
         if old_cover_id != 'cover':
             print(f"Renaming cover image ID from '{old_cover_id}' to 'cover' to work around Nook Color bug and satisfy Calibre requirements.")
-            
+
             # If another item already has ID "cover", we must rename it to avoid collision
-            other_cover_item = next((item for item in manifest.values() if item.get('id') == 'cover' and item != cover_item), None)
+            other_cover_item = items_by_id.get('cover')
+            if other_cover_item is cover_item:
+                other_cover_item = None
             if other_cover_item is not None:
                 new_id = "cover-page"
-                existing_ids = {item.get('id') for item in manifest.values()}
+                existing_ids = set(items_by_id)
                 while new_id in existing_ids:
                     new_id = f"cover-page-{uuid.uuid4().hex[:4]}"
                 print(f"Renaming existing manifest item ID 'cover' (associated with {other_cover_item.get('href')}) to '{new_id}' to avoid collision.")
@@ -662,7 +764,11 @@ def modernize_html_and_css_files(opf_dir, manifest, ncx_path):
     
     # Store global ID mappings: id_mappings[file_href][old_id] = new_id
     id_mappings = defaultdict(dict)
-    
+
+    # Parsed soups from pass 1, kept so pass 2 doesn't re-read and re-parse
+    # every document just to look at its cross-file links
+    soup_cache = {}
+
     if not html_items:
         return ul_disc_needed
 
@@ -670,12 +776,13 @@ def modernize_html_and_css_files(opf_dir, manifest, ncx_path):
     for href, item in pbar:
         html_path = opf_dir / unquote(href)
         if not html_path.exists(): continue
-        
+
         pbar.set_postfix(file=href[-30:], refresh=False)
         modified = False
         try:
             content = html_path.read_bytes()
             soup = BeautifulSoup(content, 'lxml-xml')
+            soup_cache[href] = soup
 
             # Ensure HTML5 DOCTYPE (HTM-004)
             doctypes = [c for c in soup.contents if isinstance(c, Doctype)]
@@ -785,9 +892,13 @@ def modernize_html_and_css_files(opf_dir, manifest, ncx_path):
             pbar_p2.set_postfix(file=href[-30:], refresh=False)
             modified = False
             try:
-                content = html_path.read_bytes()
-                soup = BeautifulSoup(content, 'lxml-xml')
-                
+                # Pass 1 already parsed (and possibly rewrote) this document;
+                # its soup reflects the current on-disk state
+                soup = soup_cache.get(href)
+                if soup is None:
+                    content = html_path.read_bytes()
+                    soup = BeautifulSoup(content, 'lxml-xml')
+
                 current_dir = os.path.dirname(href)
                 
                 for a in soup.find_all(True, href=True):
@@ -988,7 +1099,6 @@ def ensure_nonlinear_reachable(opf_root, manifest, ns, opf_dir):
             nav_path = opf_dir / unquote(nav_href)
             if nav_path.exists():
                 try:
-                    import posixpath
                     content = nav_path.read_bytes()
                     soup = BeautifulSoup(content, 'lxml-xml')
                     body = soup.find('body')
@@ -1068,6 +1178,37 @@ def extract_refs(tokens, is_import=False):
     return refs
 
 
+def extract_stylesheet_refs(css_text):
+    """Return every url()/@import reference in a stylesheet.
+
+    A compiled regex covers the overwhelmingly common forms in one pass;
+    the tinycss2 AST walk also runs when the regex finds nothing despite
+    reference syntax being present, or when the text contains backslash
+    escapes the regex reads literally (url("\\66 oo.png") must decode to
+    foo.png). Its results are unioned with the regex hits: this feeds a
+    deletion pass, so a misread ref must err toward keeping the file.
+    """
+    refs = []
+    for m in CSS_REF_RE.finditer(css_text):
+        ref = m.group(1) or m.group(2) or m.group(3) or m.group(4)
+        if ref:
+            refs.append(ref)
+    lowered = css_text.lower()
+    if 'url(' not in lowered and '@import' not in lowered:
+        return refs
+    if refs and '\\' not in css_text:
+        return refs
+
+    rules = tinycss2.parse_stylesheet(css_text, skip_comments=True, skip_whitespace=True)
+    for rule in rules:
+        is_import = (rule.type == 'at-rule' and rule.at_keyword == 'import')
+        if hasattr(rule, 'prelude') and rule.prelude:
+            refs.extend(extract_refs(rule.prelude, is_import=is_import))
+        if hasattr(rule, 'content') and rule.content:
+            refs.extend(extract_refs(rule.content))
+    return list(dict.fromkeys(refs))
+
+
 def remove_unreferenced(ctx: EpubContext, manifest, tree, ns, root, content_dir=None, show_summary=True):
     # Map unquoted path to original manifest key
     unquoted_manifest = {}
@@ -1075,241 +1216,265 @@ def remove_unreferenced(ctx: EpubContext, manifest, tree, ns, root, content_dir=
         norm_href = unquote(href).replace('\\', '/')
         unquoted_manifest[norm_href] = href
 
+    # Each scanned file resolves many refs against the same base directory, so
+    # cache the absolute posix form of each base once and keep the per-ref
+    # work down to a posixpath join + normpath + relpath. The join must
+    # happen on absolute paths: a content-relative base like '..' cannot
+    # cancel against a ref that descends back into the content dir.
+    base_abs_cache = {}
+    content_abs = str(content_dir).replace('\\', '/')
+
     # Helper to resolve a raw href (from OPF metadata, HTML, CSS, etc.) to the matching original manifest href
+    resolve_cache = {}
+
     def resolve_to_manifest(raw_href, base_dir=None):
-        if not raw_href:
+        if not raw_href or raw_href.startswith(SKIP_REF_PREFIXES):
             return None
+        # Shared assets (stylesheets, fonts) recur across chapters, so the
+        # same (ref, base) pair resolves many times — memoize the result
+        key = (raw_href, base_dir)
+        if key in resolve_cache:
+            return resolve_cache[key]
         # Split hash fragment if any
         raw_href = raw_href.split('#')[0]
         # Unquote and normalize slashes
         unquoted_ref = unquote(raw_href).replace('\\', '/')
-        
-        # If there's a base_dir, make it relative to content_dir
+
+        # If there's a base_dir, resolve against it and re-relativize to
+        # content_dir, mirroring the filesystem math
         if base_dir is not None:
-            abs_path = os.path.normpath(os.path.join(base_dir, unquoted_ref))
-            rel_path = os.path.relpath(abs_path, content_dir).replace('\\', '/')
+            base_abs = base_abs_cache.get(base_dir)
+            if base_abs is None:
+                base_abs = str(base_dir).replace('\\', '/')
+                base_abs_cache[base_dir] = base_abs
+            abs_path = posixpath.normpath(posixpath.join(base_abs, unquoted_ref))
+            rel_path = posixpath.relpath(abs_path, content_abs)
         else:
             rel_path = unquoted_ref
-            
-        return unquoted_manifest.get(rel_path)
 
-    # 1. Initialize files_to_keep with essential references
-    spine_refs = {item.attrib["idref"] for item in tree.findall(".//opf:itemref", ns)}
+        item = unquoted_manifest.get(rel_path)
+        resolve_cache[key] = item
+        return item
+
+    # 1. Initialize files_to_keep with essential references.
+    # One walk over the OPF tree collects spine refs, guide references,
+    # the legacy cover meta and manifest items, instead of five findall passes.
+    opf_tag = '{' + ns['opf'] + '}'
+    spine_refs = set()
+    guide_hrefs = []
+    cover_id = None
+    items_by_id = {}
+    property_items = []
+    for elem in tree.iter(opf_tag + 'itemref', opf_tag + 'reference', opf_tag + 'meta', opf_tag + 'item'):
+        tag = elem.tag
+        if tag == opf_tag + 'itemref':
+            idref = elem.get('idref')
+            if idref:
+                spine_refs.add(idref)
+        elif tag == opf_tag + 'reference':
+            parent = elem.getparent()
+            if parent is not None and parent.tag == opf_tag + 'guide':
+                guide_hrefs.append(elem.get('href'))
+        elif tag == opf_tag + 'meta':
+            if not cover_id and elem.get('name') == 'cover':
+                cover_id = elem.get('content')
+        else:  # item
+            item_id = elem.get('id')
+            if item_id:
+                items_by_id[item_id] = elem
+            if elem.get('properties'):
+                property_items.append(elem)
+
     files_to_keep = {i.attrib["href"] for i in manifest.values() if i.attrib.get("id") in spine_refs}
 
-    for reference in tree.findall(".//opf:guide/opf:reference", ns):
-        href = reference.get("href")
+    for href in guide_hrefs:
         resolved = resolve_to_manifest(href, content_dir)
         if resolved:
             files_to_keep.add(resolved)
 
-    cover_id = None
-    for meta in tree.findall(".//opf:meta[@name='cover']", ns):
-        cover_id = meta.get("content")
-        if cover_id:
-            break
-    if cover_id:
-        for item in tree.findall(".//opf:item", ns):
-            if item.get("id") == cover_id:
-                cover_href = item.get("href")
-                if cover_href:
-                    files_to_keep.add(cover_href)
-
-    for item in tree.findall(".//opf:item[@properties]", ns):
+    if cover_id and cover_id in items_by_id:
+        cover_href = items_by_id[cover_id].get("href")
+        if cover_href:
+            files_to_keep.add(cover_href)
+
+    for item in property_items:
         if "cover-image" in item.get("properties", "").split():
             cover_href = item.get("href")
             if cover_href:
                 files_to_keep.add(cover_href)
 
-    essential_patterns = ["*.ncx", "nav.xhtml", "*[Cc]ontents*", "*logo*", "META-INF/*"]
     for href in manifest:
         unquoted_href = unquote(href).replace('\\', '/')
-        if any(fnmatch(href, pat) or fnmatch(unquoted_href, pat) for pat in essential_patterns):
+        if ESSENTIAL_RE.match(href) or ESSENTIAL_RE.match(unquoted_href):
             files_to_keep.add(href)
 
     # 2. Iteratively find all references by scanning files
     # Start scanning with all XHTML files, not just the spine
-    files_to_scan = []
     seen_queued = set()
+    wave = []
     for href, item in manifest.items():
         if item.attrib.get("media-type") == "application/xhtml+xml":
             if href not in seen_queued:
-                files_to_scan.append(href)
+                wave.append(href)
                 seen_queued.add(href)
-    
-    processed_scans = set()
-    
-    pbar = tqdm(total=len(files_to_scan), unit="file", desc="Scanning references", disable=not show_summary, leave=True)
-    while files_to_scan:
-        href = files_to_scan.pop(0)
-        if href in processed_scans:
-            pbar.total -= 1
-            continue
-        processed_scans.add(href)
-        files_to_keep.add(href)
-        
-        pbar.set_postfix(file=href[-40:], refresh=False)
 
+    def scan_file(href):
+        """Scan one file and return (raw_refs, file_dir, messages).
+
+        Runs on a worker thread: it only reads shared state (manifest,
+        content_dir) and returns what it found; queue and keep-set
+        bookkeeping stay with the caller.
+        """
+        raw_refs = []
+        messages = []
         unquoted_href = unquote(href).replace('\\', '/')
         file_path = content_dir / unquoted_href
         if not file_path.exists():
-            pbar.update(1)
-            continue
+            return raw_refs, None, messages
 
         file_dir = file_path.parent
-        
+
         try:
             # Use binary read and detect encoding if possible, but for performance,
             # we'll stick to a fast read and specific parsing.
-            is_html = href.lower().endswith(('.xhtml', '.html', '.htm'))
-            if not is_html:
-                manifest_item = manifest.get(href)
-                if manifest_item is not None and manifest_item.get('media-type') == 'application/xhtml+xml':
-                    is_html = True
-            
-            is_css = href.lower().endswith('.css')
-            if not is_css:
+            href_lower = href.lower()
+            is_html = href_lower.endswith(('.xhtml', '.html', '.htm'))
+            is_css = href_lower.endswith('.css')
+            if not (is_html or is_css):
                 manifest_item = manifest.get(href)
-                if manifest_item is not None and manifest_item.get('media-type') == 'text/css':
-                    is_css = True
+                if manifest_item is not None:
+                    media_type = manifest_item.get('media-type')
+                    is_html = media_type == 'application/xhtml+xml'
+                    is_css = media_type == 'text/css'
 
             if is_html:
-                content = file_path.read_bytes()
-                soup = BeautifulSoup(content, 'lxml-xml')
-                
-                # Scan all tag attributes for references
-                for tag in soup.find_all(True):
-                    for attr, val in tag.attrs.items():
+                # Single lxml pass over the document: pull href/src/poster and
+                # style attributes plus <style> blocks in one traversal instead
+                # of building a full BeautifulSoup tree and walking it three times.
+                for _, elem in ET.iterparse(str(file_path), events=('end',), recover=True):
+                    for attr, val in elem.attrib.items():
                         lower_attr = attr.lower()
-                        if lower_attr in ('href', 'src', 'poster') or lower_attr.endswith(':href') or lower_attr.endswith(':src') or lower_attr.endswith('}href') or lower_attr.endswith('}src'):
-                            resolved = resolve_to_manifest(val, file_dir)
-                            if resolved and resolved not in seen_queued:
-                                files_to_scan.append(resolved)
-                                seen_queued.add(resolved)
-                                pbar.total += 1
-                
-                # Scan style attributes
-                for tag in soup.find_all(True, attrs={'style': True}):
-                    try:
-                        declarations = tinycss2.parse_declaration_list(tag['style'], skip_comments=True, skip_whitespace=True)
-                        for ref in extract_refs(declarations):
-                            resolved = resolve_to_manifest(ref, file_dir)
-                            if resolved and resolved not in seen_queued:
-                                files_to_scan.append(resolved)
-                                seen_queued.add(resolved)
-                                pbar.total += 1
-                    except Exception:
-                        pass
-
-                # Scan style tags in HTML/XHTML
-                for tag in soup.find_all('style'):
-                    style_content = tag.string
-                    if style_content:
+                        if lower_attr in REF_ATTRS or lower_attr.endswith(REF_ATTR_SUFFIXES):
+                            raw_refs.append(val)
+                        elif lower_attr == 'style':
+                            for m in CSS_URL_RE.finditer(val):
+                                raw_refs.append(m.group(1) or m.group(2) or m.group(3))
+
+                    # <style> blocks get the full stylesheet treatment
+                    local_name = elem.tag.rsplit('}', 1)[-1] if isinstance(elem.tag, str) else None
+                    if local_name == 'style' and elem.text:
                         try:
-                            rules = tinycss2.parse_stylesheet(style_content, skip_comments=True, skip_whitespace=True)
-                            for rule in rules:
-                                is_import = (rule.type == 'at-rule' and rule.at_keyword == 'import')
-                                all_refs = []
-                                if hasattr(rule, 'prelude') and rule.prelude:
-                                    all_refs.extend(extract_refs(rule.prelude, is_import=is_import))
-                                if hasattr(rule, 'content') and rule.content:
-                                    all_refs.extend(extract_refs(rule.content))
-                                
-                                for ref in all_refs:
-                                    resolved = resolve_to_manifest(ref, file_dir)
-                                    if resolved and resolved not in seen_queued:
-                                        files_to_scan.append(resolved)
-                                        seen_queued.add(resolved)
-                                        pbar.total += 1
+                            raw_refs.extend(extract_stylesheet_refs(elem.text))
                         except Exception as e:
                             if ctx.verbose:
-                                pbar.write(f"Error parsing style tag in {href}: {e}")
-            
+                                messages.append(f"Error parsing style tag in {href}: {e}")
+                    elem.clear()
+
             # Scan CSS for @import, url(), and @font-face
             elif is_css:
                 content = file_path.read_text(encoding='utf-8', errors='ignore')
                 try:
-                    rules = tinycss2.parse_stylesheet(content, skip_comments=True, skip_whitespace=True)
-                    for rule in rules:
-                        is_import = (rule.type == 'at-rule' and rule.at_keyword == 'import')
-                        all_refs = []
-                        if hasattr(rule, 'prelude') and rule.prelude:
-                            all_refs.extend(extract_refs(rule.prelude, is_import=is_import))
-                        if hasattr(rule, 'content') and rule.content:
-                            all_refs.extend(extract_refs(rule.content))
-                        
-                        for ref in all_refs:
-                            resolved = resolve_to_manifest(ref, file_dir)
-                            if resolved and resolved not in seen_queued:
-                                files_to_scan.append(resolved)
-                                seen_queued.add(resolved)
-                                pbar.total += 1
+                    raw_refs.extend(extract_stylesheet_refs(content))
                 except Exception as e:
                     if ctx.verbose:
-                        pbar.write(f"Error parsing CSS {href}: {e}")
+                        messages.append(f"Error parsing CSS {href}: {e}")
 
         except Exception as e:
             if ctx.verbose:
-                pbar.write(f"Error scanning file {href}: {e}")
-        
-        pbar.update(1)
-    
+                messages.append(f"Error scanning file {href}: {e}")
+
+        # The same stylesheet/image ref tends to appear on many elements of
+        # one file; dedupe (order-preserving) before handing back for
+        # resolution so each unique ref is resolved once per file.
+        return list(dict.fromkeys(raw_refs)), file_dir, messages
+
+    # lxml and tinycss2 do their parsing in C, so threads overlap nicely on the
+    # file reads and parse work; resolution and queueing stay single-threaded.
+    pbar = tqdm(total=len(wave), unit="file", desc="Scanning references", disable=not show_summary, leave=True)
+    max_workers = min(8, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while wave:
+            futures = {executor.submit(scan_file, href): href for href in wave}
+            wave = []
+            for future in as_completed(futures):
+                href = futures[future]
+                files_to_keep.add(href)
+                pbar.set_postfix(file=href[-40:], refresh=False)
+
+                raw_refs, file_dir, messages = future.result()
+                for message in messages:
+                    pbar.write(message)
+                for ref in raw_refs:
+                    resolved = resolve_to_manifest(ref, file_dir)
+                    if resolved and resolved not in seen_queued:
+                        wave.append(resolved)
+                        seen_queued.add(resolved)
+                        pbar.total += 1
+                pbar.update(1)
     pbar.close()
 
     # 3. Remove files that are not in our final keep list
-    # Pre-calculate parent map for efficient node removal
-    parent_map = {c: p for p in tree.iter() for c in p}
-    
-    for href, node in list(manifest.items()):
-        if href not in files_to_keep:
-            file_path = content_dir / unquote(href)
-            size = 0
-            if file_path.exists():
-                size = file_path.stat().st_size
-                file_path.unlink()
+    # Decide what to drop first, then mutate; avoids snapshotting every entry
+    to_remove = [(href, node) for href, node in manifest.items() if href not in files_to_keep]
+    removed_nodes = set()
+    for href, node in to_remove:
+        file_path = content_dir / unquote(href)
+        size = 0
+        if file_path.exists():
+            size = file_path.stat().st_size
+            file_path.unlink()
+        else:
+            if ctx.verbose:
+                print(f"File to remove not found on disk: {href} (removing from manifest)")
+
+        removed_nodes.add(node)
+
+        # Keep in-memory manifest dict in sync
+        del manifest[href]
+
+        if show_summary:
+            if size > 0:
+                print(f"Dropping unreferenced file: {href} ({human(size)})")
             else:
-                if ctx.verbose:
-                    print(f"File to remove not found on disk: {href} (removing from manifest)")
-            
-            # Remove from XML manifest
-            parent = parent_map.get(node)
-            if parent is not None:
-                parent.remove(node)
-
-            # Keep in-memory manifest dict in sync
-            if href in manifest:
-                del manifest[href]
-
-            if show_summary:
-                if size > 0:
-                    print(f"Dropping unreferenced file: {href} ({human(size)})")
-                else:
-                    print(f"Dropping unreferenced missing file reference: {href}")
+                print(f"Dropping unreferenced missing file reference: {href}")
+
+    # Rebuild each touched parent's child list once instead of one
+    # per-node remove() (which shifts siblings on every call)
+    if removed_nodes:
+        for parent in {node.getparent() for node in removed_nodes} - {None}:
+            parent[:] = [child for child in parent if child not in removed_nodes]
+
+
+DEFAULT_PURGES = [
+    "*.DS_Store",
+    "*.epubcheck*",
+    "SS_recommendpage*",
+    "_signup_*",
+    "*cross-sale*",
+    "*cross-sell*",
+    "*xpromo*",
+    "promo.css",
+    "next-reads",
+    "newsletter",
+    "com.apple.ibooks.display-options.xml",
+]
+# Constant part of the purge set, compiled once; unzip uses it to skip
+# doomed members before they ever hit the disk
+DEFAULT_PURGE_RE = re.compile('|'.join(f'(?:{translate(p)})' for p in DEFAULT_PURGES))
 
 
 def purge_unwanted_files(ctx: EpubContext, purge_patterns, extract_dir, content_dir, tree, manifest, show_summary=True):
     if ctx.verbose and show_summary:
         print("Purging unwanted files...")
-    DEFAULT_PURGES = [
-        "*.DS_Store",
-        "*.epubcheck*",
-        "SS_recommendpage*",
-        "_signup_*",
-        "*cross-sale*",
-        "*cross-sell*",
-        "*xpromo*",
-        "promo.css",
-        "next-reads",
-        "newsletter",
-        "com.apple.ibooks.display-options.xml",
-    ]
     all_patterns = DEFAULT_PURGES + (purge_patterns or [])
-    for relative_filename in list(manifest.keys()):
-        filename = os.path.basename(relative_filename)
-        if any(fnmatch(filename, pat) for pat in all_patterns):
-            remove_asset(tree, content_dir, relative_filename, manifest_dict=manifest)
-            if show_summary:
-                print(f"Purged unwanted file: {relative_filename} from spine, manifest, and disk")
+    # One combined regex instead of per-file fnmatch over every pattern
+    purge_re = re.compile('|'.join(f'(?:{translate(p)})' for p in all_patterns))
+    # Collect matches first so the scan runs on the live dict, then mutate
+    to_purge = [href for href in manifest if purge_re.match(os.path.basename(href))]
+    for relative_filename in to_purge:
+        remove_asset(tree, content_dir, relative_filename, manifest_dict=manifest)
+        if show_summary:
+            print(f"Purged unwanted file: {relative_filename} from spine, manifest, and disk")
 
 
 def remove_asset(tree, content_dir, href, manifest_dict=None):
@@ -1320,7 +1485,10 @@ def remove_asset(tree, content_dir, href, manifest_dict=None):
         spine = tree.find("{http://www.idpf.org/2007/opf}spine")
         
         item = None
-        if manifest is not None:
+        if manifest_dict is not None:
+            # The in-memory manifest already maps href -> item element
+            item = manifest_dict.get(href)
+        if item is None and manifest is not None:
             # Search all items for the matching href
             for manifest_item in manifest.findall("*"):
                 if manifest_item.get("href") == href:
@@ -1350,7 +1518,9 @@ def remove_asset(tree, content_dir, href, manifest_dict=None):
         file_path = content_dir / unquote(href)
         if file_path.exists():
             file_path.unlink()
-        else:
+        elif not DEFAULT_PURGE_RE.match(posixpath.basename(unquote(href))):
+            # Default-purged members are skipped at extraction time, so their
+            # absence from disk is expected and not worth a warning.
             print(f"Warning: File {href} not found on disk, but removed from manifest/spine.")
         
     except Exception as e:
@@ -1358,184 +1528,376 @@ def remove_asset(tree, content_dir, href, manifest_dict=None):
         raise
 
 
+IMAGE_TYPE_BY_EXT = {
+    '.jpg': 'JPEG', '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.webp': 'WebP',
+}
+
+
 def analyze_images(ctx: EpubContext, root, show_summary=True):
     """Find all image paths relative to root and optionally print a summary."""
-    jpg_paths = [p.relative_to(root) for p in [*root.rglob("*.jpg"), *root.rglob("*.jpeg")]]
-    png_paths = [p.relative_to(root) for p in root.rglob("*.png")]
-    webp_paths = [p.relative_to(root) for p in root.rglob("*.webp")]
-    
-    # Store quality and size per type
-    types = [
-        ("JPEG", jpg_paths),
-        ("PNG", png_paths),
-        ("WebP", webp_paths)
-    ]
-    
+    # One scandir-based walk instead of one rglob pass per extension; scandir
+    # entries carry stat info, so the sizes come along for free.
+    paths_by_type = {'JPEG': [], 'PNG': [], 'WebP': []}
+    size_by_type = {'JPEG': 0, 'PNG': 0, 'WebP': 0}
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        img_type = IMAGE_TYPE_BY_EXT.get(os.path.splitext(entry.name)[1].lower())
+                        if img_type:
+                            paths_by_type[img_type].append(pathlib.Path(entry.path).relative_to(root))
+                            size_by_type[img_type] += entry.stat().st_size
+        except OSError as e:
+            if ctx.verbose:
+                print(f"Warning: Could not scan {current}: {e}")
+
+    jpg_paths = sorted(paths_by_type['JPEG'])
+    png_paths = sorted(paths_by_type['PNG'])
+    webp_paths = sorted(paths_by_type['WebP'])
+
     type_summaries = []
-    
-    for name, paths in types:
+    for name, paths in [("JPEG", jpg_paths), ("PNG", png_paths), ("WebP", webp_paths)]:
         count = len(paths)
         if count == 0:
             type_summaries.append(f"0 {name} files")
             continue
-            
-        size = sum((root / p).stat().st_size for p in paths)
-        summary = f"{count} {name} / {human(size)}"
-        type_summaries.append(summary)
+        type_summaries.append(f"{count} {name} / {human(size_by_type[name])}")
 
     if show_summary:
         summary_line = f"Found {type_summaries[0]}, {type_summaries[1]} and {type_summaries[2]}"
         print(summary_line)
-    
+
     return jpg_paths, png_paths, webp_paths
 
 
+def compress_image(path_str: str, quality: int, img_type: str):
+    """Compress a single image in place.
+
+    Runs inside a worker process, so it takes only picklable arguments and
+    returns (before, after, error) instead of printing.
+    """
+    p = pathlib.Path(path_str)
+    before = p.stat().st_size
+    after = before
+    error = None
+
+    # Create a temporary file to perform compression
+    tmp_path = None
+    try:
+        suffix = p.suffix.lower()
+        # Sibling temp file: same directory means same filesystem, so the
+        # final os.replace is atomic and readers never see a partial write
+        with tempfile.NamedTemporaryFile(suffix=suffix, dir=p.parent, delete=False) as tmp:
+            tmp_path = pathlib.Path(tmp.name)
+
+        # Copy original to temp file because CLI tools compress in-place
+        shutil.copy2(p, tmp_path)
+
+        if quality == 100:
+            if img_type == 'PNG':
+                if oxipng is not None:
+                    # In-process bindings avoid one subprocess spawn per image
+                    oxipng.optimize(str(tmp_path), level=3,
+                                    strip=oxipng.StripChunks.all(),
+                                    optimize_alpha=True)
+                else:
+                    # One thread: the process pool already covers the cores,
+                    # and a single file gives oxipng little to fan out over
+                    oxipng_args = ["oxipng", "-o", "3", "--strip", "all", "--alpha", "--threads", "1", "-q", str(tmp_path)]
+                    subprocess.run(oxipng_args, stdout=subprocess.DEVNULL)
+            elif img_type == 'JPEG':
+                jpegoptim_args = ["jpegoptim", "--strip-all", "-q", str(tmp_path)]
+                subprocess.run(jpegoptim_args, stdout=subprocess.DEVNULL)
+            else:
+                # Lossless fallback for WebP or others
+                with Image.open(p) as img:
+                    img.save(tmp_path, format=img.format, optimize=True)
+        else:
+            if img_type == "PNG":
+                if which_cached("pngquant"):
+                    pngquant_args = [
+                        "pngquant",
+                        "--force",
+                        "--skip-if-larger",
+                        "--ext", ".png",
+                        "--quality", f"{max(0, quality-10)}-{quality}",
+                        str(tmp_path)
+                    ]
+                    subprocess.run(pngquant_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                else:
+                    with Image.open(p) as img:
+                        img = img.convert("P", palette=Image.ADAPTIVE)
+                        img.save(tmp_path, format="PNG", optimize=True)
+            elif img_type == "JPEG" and which_cached("jpegoptim"):
+                # jpegoptim -m re-encodes only when above the target quality and
+                # works directly on the file, avoiding a Pillow decode/encode cycle
+                jpegoptim_args = ["jpegoptim", "--strip-all", f"-m{quality}", "-q", str(tmp_path)]
+                subprocess.run(jpegoptim_args, stdout=subprocess.DEVNULL)
+            else:
+                with Image.open(p) as img:
+                    fmt = img.format or img_type
+                    if fmt == "JPEG":
+                        img.save(tmp_path, format="JPEG", quality=quality, optimize=True, progressive=True)
+                    else:
+                        img.save(tmp_path, format=fmt, quality=quality, optimize=True)
+
+        after_size = tmp_path.stat().st_size
+        if after_size < before:
+            os.replace(tmp_path, p)
+            # The replaced size is already known; no need to re-stat
+            after = after_size
+    except Exception as e:
+        error = str(e)
+    finally:
+        if tmp_path and tmp_path.exists():
+            try:
+                tmp_path.unlink()
+            except Exception:
+                pass
+
+    return before, after, error
+
+
+def _compress_batch(path_strs, args, tmp_prefix, suffix=None):
+    """Run one tool invocation over temp copies of a batch of images.
+
+    Shared scaffolding for compress_jpeg_batch/compress_png_batch: copy each
+    file into a scratch dir, append all the copies to args for a single run,
+    then promote each result that came out smaller. Same contract per file
+    as compress_image: returns a list of (before, after, error). Promotion
+    stages a sibling copy and os.replace()s it, so readers never see a
+    partial write even though the scratch dir may be on another filesystem.
+    """
+    results = []
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix=tmp_prefix))
+    try:
+        tmp_paths = []
+        for i, path_str in enumerate(path_strs):
+            p = pathlib.Path(path_str)
+            tmp_path = tmp_dir / f"{i}{suffix or p.suffix.lower()}"
+            shutil.copy2(p, tmp_path)
+            tmp_paths.append(tmp_path)
+
+        subprocess.run(args + [str(t) for t in tmp_paths],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        for path_str, tmp_path in zip(path_strs, tmp_paths):
+            p = pathlib.Path(path_str)
+            before = p.stat().st_size
+            after = before
+            error = None
+            try:
+                if tmp_path.exists():
+                    tmp_size = tmp_path.stat().st_size
+                    if tmp_size < before:
+                        with tempfile.NamedTemporaryFile(suffix=p.suffix, dir=p.parent,
+                                                         delete=False) as sib:
+                            sibling = pathlib.Path(sib.name)
+                        try:
+                            shutil.copy2(tmp_path, sibling)
+                            os.replace(sibling, p)
+                        except BaseException:
+                            sibling.unlink(missing_ok=True)
+                            raise
+                        after = tmp_size
+            except Exception as e:
+                error = str(e)
+            results.append((before, after, error))
+    except Exception as e:
+        # Batch-level failure: report the originals untouched
+        results = [(pathlib.Path(s).stat().st_size, pathlib.Path(s).stat().st_size, str(e))
+                   for s in path_strs]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def compress_jpeg_batch(path_strs, quality):
+    """Run one jpegoptim invocation over a batch of JPEGs.
+
+    Amortizes process startup over many files; see _compress_batch for the
+    per-file contract.
+    """
+    args = ["jpegoptim", "--strip-all", "-q"]
+    if quality < 100:
+        args.append(f"-m{quality}")
+    return _compress_batch(path_strs, args, "epub-shrink-jpeg-")
+
+
+def compress_png_batch(path_strs, quality):
+    """Run one oxipng (lossless) or pngquant (lossy) invocation over a batch.
+
+    See _compress_batch for the per-file contract. Batches run one per pool
+    worker (workers == cores), so oxipng gets one thread; its cross-file
+    parallelism comes from the pool, not from stacking nproc threads per
+    worker.
+    """
+    if quality == 100:
+        args = ["oxipng", "-o", "3", "--strip", "all", "--alpha",
+                "--threads", "1", "-q"]
+    else:
+        args = ["pngquant", "--force", "--skip-if-larger", "--ext", ".png",
+                "--quality", f"{max(0, quality-10)}-{quality}"]
+    return _compress_batch(path_strs, args, "epub-shrink-png-", suffix=".png")
+
+
 def compress_images(ctx: EpubContext, root, quality, jpg_paths, png_paths, webp_paths):
-    
+
     savings = []
-    
+
     # Define groups
     groups = [
         (jpg_paths, 'JPEG'),
         (png_paths, 'PNG'),
         (webp_paths, 'WebP')
     ]
-    
+
     estimate_quality = ctx.weighted_avg_quality is None
     if estimate_quality:
         max_estimated_quality = 0
         weighted_q_sum = 0
         total_img_size = 0
-    
+
     for paths, img_type in groups:
         if not paths:
             continue
-            
+
         total_before = 0
         total_after = 0
-        
-        desc = f"Optimizing {img_type}s" if quality == 100 else f"Compressing {img_type}s (q={quality})"
-        pbar = tqdm(paths, unit="img", desc=desc, leave=True)
-        
-        for rel_path in pbar:
-            p = root / rel_path
-            if not p.exists():
-                continue
-                
-            pbar.set_postfix(file=rel_path.name[-30:], refresh=False)
-            before = p.stat().st_size
-            total_before += before
-            
-            image_info = None
-            if estimate_quality or ctx.verbose:
-                image_info = analyze_image_quality(ctx, p)
-                
-            if estimate_quality and image_info and 'error' not in image_info:
-                q_val = image_info.get("estimated_quality")
-                if q_val is not None:
-                    max_estimated_quality = max(max_estimated_quality, q_val)
-                else:
-                    if img_type == "PNG":
-                        q_val = 100
-                    elif img_type == "WebP":
-                        q_val = 95
-                    else:
-                        q_val = 90
-                
-                weighted_q_sum += q_val * before
-                total_img_size += before
-                
-            # Create a temporary file to perform compression
-            tmp_path = None
-            try:
-                suffix = p.suffix.lower()
-                with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-                    tmp_path = pathlib.Path(tmp.name)
-                
-                # Copy original to temp file because CLI tools compress in-place
-                shutil.copy2(p, tmp_path)
-                
-                if quality == 100:
-                    if img_type == 'PNG':
-                        oxipng_args = ["oxipng", "-o", "3", "--strip", "all", "--alpha", "--threads", "4", "-q", str(tmp_path)]
-                        subprocess.run(oxipng_args, stdout=subprocess.DEVNULL)
-                    elif img_type == 'JPEG':
-                        jpegoptim_args = ["jpegoptim", "--strip-all", "-q", str(tmp_path)]
-                        subprocess.run(jpegoptim_args, stdout=subprocess.DEVNULL)
+
+        existing = [rel_path for rel_path in paths if (root / rel_path).exists()]
+
+        # Probe images in the main process; the compression itself is farmed out
+        image_infos = {}
+        if estimate_quality or ctx.verbose:
+            for rel_path in existing:
+                image_info = ctx.image_info_cache.get(rel_path)
+                if image_info is None:
+                    image_info = analyze_image_quality(ctx, root / rel_path)
+                    ctx.image_info_cache[rel_path] = image_info
+                image_infos[rel_path] = image_info
+
+        if estimate_quality:
+            for rel_path in existing:
+                image_info = image_infos.get(rel_path)
+                if image_info and 'error' not in image_info:
+                    before = (root / rel_path).stat().st_size
+                    q_val = image_info.get("estimated_quality")
+                    if q_val is not None:
+                        max_estimated_quality = max(max_estimated_quality, q_val)
                     else:
-                        # Lossless fallback for WebP or others
-                        with Image.open(p) as img:
-                            img.save(tmp_path, format=img.format, optimize=True)
-                else:
-                    if img_type == "PNG":
-                        if shutil.which("pngquant"):
-                            pngquant_args = [
-                                "pngquant",
-                                "--force",
-                                "--skip-if-larger",
-                                "--ext", ".png",
-                                "--quality", f"{max(0, quality-10)}-{quality}",
-                                str(tmp_path)
-                            ]
-                            subprocess.run(pngquant_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                        if img_type == "PNG":
+                            q_val = 100
+                        elif img_type == "WebP":
+                            q_val = 95
                         else:
-                            with Image.open(p) as img:
-                                img = img.convert("P", palette=Image.ADAPTIVE)
-                                img.save(tmp_path, format="PNG", optimize=True)
-                    else:
-                        with Image.open(p) as img:
-                            fmt = img.format or img_type
-                            if fmt == "JPEG":
-                                img.save(tmp_path, format="JPEG", quality=quality, optimize=True, progressive=True)
-                            else:
-                                img.save(tmp_path, format=fmt, quality=quality, optimize=True)
-                
-                after_size = tmp_path.stat().st_size
-                if after_size < before:
-                    shutil.copy2(tmp_path, p)
-            except Exception as e:
+                            q_val = 90
+
+                    weighted_q_sum += q_val * before
+                    total_img_size += before
+
+        desc = f"Optimizing {img_type}s" if quality == 100 else f"Compressing {img_type}s (q={quality})"
+        pbar = tqdm(total=len(existing), unit="img", desc=desc, leave=True)
+
+        # Tiny images can't repay the compressor round-trip; count them as-is
+        to_compress = []
+        for rel_path in existing:
+            before = (root / rel_path).stat().st_size
+            if before < MIN_COMPRESS_BYTES:
+                total_before += before
+                total_after += before
+                savings.append((before, before))
                 if ctx.verbose:
-                    pbar.write(f"Image compress error: {p} {e}")
-            finally:
-                if tmp_path and tmp_path.exists():
-                    try:
-                        tmp_path.unlink()
-                    except Exception:
-                        pass
-            
-            after = p.stat().st_size
-            total_after += after
-            savings.append((before, after))
-            
-            if ctx.verbose:
-                reduction_pct = (before - after) / before * 100 if before > 0 else 0
-                if image_info and 'error' not in image_info:
-                    fmt = image_info['format']
-                    dims = f"{image_info['dimensions'][0]}x{image_info['dimensions'][1]}"
-                    mode = image_info['mode']
-                    output = f"{fmt}: {rel_path} | Dims: {dims} | Mode: {mode}"
-                    if fmt == "JPEG":
-                        est_quality = f"{image_info['estimated_quality'] or 'Unknown'}"
-                        output += f" | Est.Quality: {est_quality}"
-                    elif fmt == "PNG" and image_info['png_info']:
-                        color_type = image_info['png_info'].get('color_type', 'Unknown')
-                        output += f" | Type: {color_type}"
-                    output += f" | Quality: {quality} | {human(before)} → {human(after)} ({reduction_pct:.1f}% saved)"
-                    pbar.write(output)
+                    pbar.write(f"Skipping {rel_path}: {human(before)} is below the compression threshold")
+                pbar.update(1)
+            else:
+                to_compress.append(rel_path)
+
+        # Each image is an independent CPU-bound job, so spread them over the
+        # cores. JPEGs with jpegoptim available are submitted in chunks so one
+        # subprocess handles many files instead of one spawn per image.
+        workers = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            if img_type == 'JPEG':
+                batch_fn = compress_jpeg_batch if which_cached("jpegoptim") else None
+            elif img_type == 'PNG':
+                # In-process pyoxipng bindings already avoid spawns; only the
+                # CLI tools benefit from batching
+                if quality == 100:
+                    use_batch = oxipng is None and which_cached("oxipng")
                 else:
-                    pbar.write(f"File: {rel_path} | {human(before)} → {human(after)} ({reduction_pct:.1f}% saved)")
-                    
+                    use_batch = which_cached("pngquant")
+                batch_fn = compress_png_batch if use_batch else None
+            else:
+                batch_fn = None
+
+            if batch_fn is not None:
+                chunk_size = max(1, min(32, (len(to_compress) + workers - 1) // workers))
+                for i in range(0, len(to_compress), chunk_size):
+                    chunk = to_compress[i:i + chunk_size]
+                    future = executor.submit(batch_fn,
+                                             [str(root / rel_path) for rel_path in chunk], quality)
+                    futures[future] = chunk
+            else:
+                for rel_path in to_compress:
+                    futures[executor.submit(compress_image, str(root / rel_path), quality, img_type)] = [rel_path]
+
+            for future in as_completed(futures):
+                chunk = futures[future]
+                results = future.result()
+                if isinstance(results, tuple):
+                    results = [results]
+
+                for rel_path, (before, after, error) in zip(chunk, results):
+                    pbar.set_postfix(file=rel_path.name[-30:], refresh=False)
+
+                    if error and ctx.verbose:
+                        pbar.write(f"Image compress error: {root / rel_path} {error}")
+
+                    total_before += before
+                    total_after += after
+                    savings.append((before, after))
+
+                    if ctx.verbose:
+                        image_info = image_infos.get(rel_path)
+                        reduction_pct = (before - after) / before * 100 if before > 0 else 0
+                        if image_info and 'error' not in image_info:
+                            fmt = image_info['format']
+                            dims = f"{image_info['dimensions'][0]}x{image_info['dimensions'][1]}"
+                            mode = image_info['mode']
+                            output = f"{fmt}: {rel_path} | Dims: {dims} | Mode: {mode}"
+                            if fmt == "JPEG":
+                                est_quality = f"{image_info['estimated_quality'] or 'Unknown'}"
+                                output += f" | Est.Quality: {est_quality}"
+                            elif fmt == "PNG" and image_info['png_info']:
+                                color_type = image_info['png_info'].get('color_type', 'Unknown')
+                                output += f" | Type: {color_type}"
+                            output += f" | Quality: {quality} | {human(before)} → {human(after)} ({reduction_pct:.1f}% saved)"
+                            pbar.write(output)
+                        else:
+                            pbar.write(f"File: {rel_path} | {human(before)} → {human(after)} ({reduction_pct:.1f}% saved)")
+
+                    pbar.update(1)
+
         pbar.close()
-        
+
         if total_before > 0:
             reduction_pct = (total_before - total_after) / total_before * 100
             action = "Optimized" if quality == 100 else "Compressed"
             print(f"{action} {img_type}s (q={quality}): {human(total_before)} → {human(total_after)} ({reduction_pct:.1f}% saved)")
-            
+
     if estimate_quality:
         ctx.max_estimated_quality = max_estimated_quality
         ctx.weighted_avg_quality = (weighted_q_sum / total_img_size) if total_img_size > 0 else 100.0
-            
+
     return savings
 
 
@@ -1550,39 +1912,41 @@ def analyze_image_quality(ctx: EpubContext, path: pathlib.Path):
         A tuple of (image format, estimated quality, color mode, dimensions)
     """
     try:
-        img = Image.open(path)
-        fmt = img.format
-        mode = img.mode
-        dimensions = img.size
-        
-        estimated_quality = None
+        # Image.open is lazy: this reads headers only and never decodes pixel
+        # data; close it as soon as the probing attributes have been read.
+        with Image.open(path) as img:
+            fmt = img.format
+            mode = img.mode
+            dimensions = img.size
+            estimated_quality = None
+            qtables = img.quantization if fmt == "JPEG" and hasattr(img, 'quantization') else None
+            text_info = img.text if hasattr(img, 'text') else {}
+            palette = img.palette if hasattr(img, 'palette') else None
+            bits = img.bits if hasattr(img, 'bits') else None
         
         # For JPEG, try to estimate quality
         if fmt == "JPEG":
             # Method to estimate JPEG quality based on quantization tables
             try:
-                # Check if we can access quantization tables
-                if hasattr(img, 'quantization'):
-                    qtables = img.quantization
-                    if qtables:
-                        # Simple algorithm for quality estimation
-                        # Higher values in qtables = lower quality
-                        if len(qtables) > 0:
-                            # Sample the first quantization table
-                            sample = list(qtables.values())[0]
-                            if isinstance(sample, list) and len(sample) > 0:
-                                # Estimate quality inversely proportional to quantization values
-                                # This is a rough approximation
-                                avg_qtable = sum(sample) / len(sample)
-                                if avg_qtable < 1:
-                                    estimated_quality = 100
-                                else:
-                                    # Rough formula, inversely proportional to average quantization value
-                                    estimated_quality = min(100, max(1, int(100 - (avg_qtable / 2.5))))
+                if qtables:
+                    # Simple algorithm for quality estimation
+                    # Higher values in qtables = lower quality
+                    if len(qtables) > 0:
+                        # Sample the first quantization table
+                        sample = list(qtables.values())[0]
+                        if isinstance(sample, list) and len(sample) > 0:
+                            # Estimate quality inversely proportional to quantization values
+                            # This is a rough approximation
+                            avg_qtable = sum(sample) / len(sample)
+                            if avg_qtable < 1:
+                                estimated_quality = 100
+                            else:
+                                # Rough formula, inversely proportional to average quantization value
+                                estimated_quality = min(100, max(1, int(100 - (avg_qtable / 2.5))))
             except Exception as e:
                 if ctx.verbose:
                     print(f"Error estimating JPEG quality: {e}")
-                    
+
         # For PNG, check color type and bit depth
         png_info = None
         if fmt == "PNG":
@@ -1590,15 +1954,12 @@ def analyze_image_quality(ctx: EpubContext, path: pathlib.Path):
             bit_depth = "unknown"
             try:
                 # Try to get more detailed PNG info
-                if hasattr(img, 'text') and 'Software' in img.text:
-                    software = img.text['Software']
-                else:
-                    software = "unknown"
-                    
+                software = text_info.get('Software', "unknown")
+
                 if mode == "P":
                     color_type = "palette"
-                    if hasattr(img, 'palette'):
-                        palette_size = len(img.palette.palette) // 3
+                    if palette is not None:
+                        palette_size = len(palette.palette) // 3
                         color_type = f"palette ({palette_size} colors)"
                 elif mode == "L":
                     color_type = "grayscale"
@@ -1608,11 +1969,11 @@ def analyze_image_quality(ctx: EpubContext, path: pathlib.Path):
                     color_type = "RGB"
                 elif mode == "RGBA":
                     color_type = "RGB+alpha"
-                    
+
                 # Get bit depth if available
-                if hasattr(img, 'bits'):
-                    bit_depth = img.bits
-                
+                if bits is not None:
+                    bit_depth = bits
+
                 png_info = {
                     "color_type": color_type,
                     "bit_depth": bit_depth,
@@ -1643,19 +2004,45 @@ def analyze_image_quality(ctx: EpubContext, path: pathlib.Path):
         }
 
 
+# File types that are already entropy-coded: DEFLATE on these burns CPU for
+# near-zero size gain, so they are stored uncompressed in the zip.
+STORED_EXTS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.woff', '.woff2',
+               '.otf', '.ttf', '.mp3', '.mp4', '.m4a', '.m4v', '.ogg', '.oga', '.opus'}
+
+
 def rebuild_epub(root: pathlib.Path, out_path: pathlib.Path):
-    all_files = sorted([f for f in root.rglob("*") if f.is_file()])
+    """Zip the exploded tree at root into out_path."""
+    # One iterative scandir walk instead of rglob("*"), which stats every
+    # entry through pathlib; same shape as the analyze_images walk
+    all_files = []
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    all_files.append(pathlib.Path(entry.path))
+    all_files.sort()
+
     with zipfile.ZipFile(out_path, "w") as z:
         mimetype_path = root / "mimetype"
         if mimetype_path.exists():
-            # this file must be the first and uncompressed
-            z.write(mimetype_path, "mimetype", compress_type=zipfile.ZIP_STORED)
+            # this file must be the first and uncompressed; its content is
+            # fixed by the spec, so write it without opening the file
+            z.writestr(zipfile.ZipInfo("mimetype"), b"application/epub+zip",
+                       compress_type=zipfile.ZIP_STORED)
             all_files = [f for f in all_files if f.name != "mimetype"]
 
         pbar = tqdm(all_files, unit="file", desc="Rebuilding EPUB", leave=True)
         for file in pbar:
             pbar.set_postfix(file=file.name[-30:], refresh=False)
-            z.write(file, file.relative_to(root), compress_type=zipfile.ZIP_DEFLATED)
+            arcname = file.relative_to(root).as_posix()
+            if file.suffix.lower() in STORED_EXTS:
+                z.write(file, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                # Text payloads (XHTML/CSS/OPF/NCX/SVG) are small: max deflate is cheap
+                z.write(file, arcname, compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
         pbar.close()
 
 def analyze_file(ctx: EpubContext):
@@ -1759,76 +2146,98 @@ def main():
     original_size = ctx.input_file.stat().st_size
     print("Original size:", human(original_size))
 
-    # 1. Analyze and Prepare
-    opf_path, tree, manifest, ns = analyze_file(ctx)
-    content_dir = opf_path.parent
+    # Everything below works inside temp dirs; one try/finally around the
+    # whole pipeline guarantees they are removed even when an early stage
+    # raises, not just once the compression loop has been entered.
+    pristine_dir = None
+    try:
+        # 1. Analyze and Prepare
+        opf_path, tree, manifest, ns = analyze_file(ctx)
+        content_dir = opf_path.parent
 
-    # 2. Purge unwanted patterns
-    purge_unwanted_files(ctx, args.purge, ctx.extract_dir, content_dir, tree, manifest, show_summary=True)
+        # 2. Purge unwanted patterns
+        purge_unwanted_files(ctx, args.purge, ctx.extract_dir, content_dir, tree, manifest, show_summary=True)
     
-    # 3. Modernize assets (convert deprecated tags, generate nav.xhtml, etc.)
-    modernize_assets(ctx.extract_dir, tree, manifest, ns, opf_path)
-
-    # 4. Prune unreferenced assets and update OPF
-    if ctx.verbose:
-        print("Performing reference analysis...")
-    prune_unreferenced_assets(ctx, tree, manifest, ns, opf_path, show_summary=True)
+        # 3. Modernize assets (convert deprecated tags, generate nav.xhtml, etc.)
+        modernize_assets(ctx.extract_dir, tree, manifest, ns, opf_path)
 
-    # 5. Image Analysis (Discovery and Summary)
-    jpg_paths, png_paths, webp_paths = analyze_images(ctx, ctx.extract_dir, show_summary=True)
-
-    # 6. Iterative Compression and Rebuild
-    q = args.quality
-    final_size = 0
-    history = []
-
-    best_meeting_q = None
-    best_meeting_size = None
-    best_meeting_path = None
-
-    smallest_size_q = None
-    smallest_size = None
-    smallest_size_path = None
-
-    lowest_failing_q = None
-    lowest_failing_size = None
-
-    tried_qualities = set()
-    refinement_steps = 0
-    MAX_REFINEMENT_STEPS = 4
-    MIN_QUALITY = 15
+        # 4. Prune unreferenced assets and update OPF
+        if ctx.verbose:
+            print("Performing reference analysis...")
+        prune_unreferenced_assets(ctx, tree, manifest, ns, opf_path, show_summary=True)
+
+        # 5. Image Analysis (Discovery and Summary)
+        jpg_paths, png_paths, webp_paths = analyze_images(ctx, ctx.extract_dir, show_summary=True)
+
+        # 6. Iterative Compression and Rebuild
+        q = args.quality
+        final_size = 0
+        history = []
+
+        best_meeting_q = None
+        best_meeting_size = None
+        best_meeting_path = None
+
+        smallest_size_q = None
+        smallest_size = None
+        smallest_size_path = None
+
+        lowest_failing_q = None
+        lowest_failing_size = None
+
+        tried_qualities = set()
+        refinement_steps = 0
+        MAX_REFINEMENT_STEPS = 4
+        MIN_QUALITY = 15
+
+        # Target in bytes, computed once; every loop check compares integers
+        target_bytes = int(args.targetsize * 1024 * 1024) if args.targetsize else None
+
+        # With a target size several lossy passes may run. Compression only ever
+        # touches image files, so snapshot just those once and restore them in
+        # place before each retry instead of copying the whole extracted tree.
+        all_image_paths = [*jpg_paths, *png_paths, *webp_paths]
+        if target_bytes is not None:
+            pristine_dir = TMP_ROOT / f"epub-pristine-{os.getpid()}"
+            if pristine_dir.exists():
+                shutil.rmtree(pristine_dir)
+            for rel_path in all_image_paths:
+                dst = pristine_dir / rel_path
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(ctx.extract_dir / rel_path, dst)
+
+        trial_paths = []
 
-    try:
         while True:
             # Avoid repeating the same quality
             if q in tried_qualities:
                 break
             tried_qualities.add(q)
 
-            # Create a fresh build directory from the cleaned extract_dir
-            build_dir = TMP_ROOT / f"epub-build-{os.getpid()}-{q}"
-            if build_dir.exists():
-                shutil.rmtree(build_dir)
-            shutil.copytree(ctx.extract_dir, build_dir)
+            # Restore pristine images before each retry (the first pass
+            # already works on the untouched extraction).
+            if pristine_dir is not None and history:
+                for rel_path in all_image_paths:
+                    src = pristine_dir / rel_path
+                    if src.exists():
+                        shutil.copy2(src, ctx.extract_dir / rel_path)
 
             # Output directly to the original file directory with suffix
             suffix = "-lossless" if q == 100 else f"-q{q}"
             iter_out = ctx.input_file.with_stem(f"{ctx.input_file.stem}{suffix}")
             if iter_out.exists():
                 iter_out.unlink()
+            trial_paths.append(iter_out)
+
+            compress_images(ctx, ctx.extract_dir, q, jpg_paths, png_paths, webp_paths)
+            rebuild_epub(ctx.extract_dir, iter_out)
 
-            compress_images(ctx, build_dir, q, jpg_paths, png_paths, webp_paths)
-            rebuild_epub(build_dir, iter_out)
-            
             final_size = iter_out.stat().st_size
             print(f"Quality {q}: {human(final_size)}")
 
             # Record this run
             history.append((q, final_size))
 
-            # Clean up build directory
-            shutil.rmtree(build_dir)
-
             # Track smallest size for fallback
             if smallest_size is None or final_size < smallest_size:
                 smallest_size = final_size
@@ -1836,7 +2245,7 @@ def main():
                 smallest_size_path = iter_out
 
             # Check if target is met
-            target_met = not args.targetsize or (final_size / (1024 * 1024) <= args.targetsize)
+            target_met = target_bytes is None or final_size <= target_bytes
 
             if target_met:
                 if best_meeting_q is None or q > best_meeting_q:
@@ -1849,11 +2258,9 @@ def main():
                     lowest_failing_size = final_size
 
             # If no target size or target met with lossless, we stop immediately
-            if not args.targetsize or (q == 100 and target_met):
+            if target_bytes is None or (q == 100 and target_met):
                 break
 
-            target_bytes = args.targetsize * 1024 * 1024
-
             if best_meeting_q is None:
                 # We haven't met the target yet, we must decrease quality
                 if q <= MIN_QUALITY:
@@ -1916,12 +2323,24 @@ def main():
             current_out = ctx.input_file.with_stem(f"{ctx.input_file.stem}{suffix}")
 
         if final_path and final_path.exists() and final_path != current_out:
-            shutil.copy2(final_path, current_out)
+            try:
+                # Atomic rename: the winning trial is promoted, not re-copied
+                os.replace(final_path, current_out)
+            except OSError:
+                # -o may point at another filesystem; fall back to a copy
+                shutil.copy2(final_path, current_out)
+
+        # Only the chosen output survives; drop the losing trial files
+        for trial_path in trial_paths:
+            if trial_path != current_out and trial_path.exists():
+                trial_path.unlink()
 
         print(f"\nFinal size: {human(final_size)} (saved {(original_size - final_size) / original_size:.1%}) of original {human(original_size)}")
         print(f"Output file: {current_out}")
 
     finally:
+        if pristine_dir is not None and pristine_dir.exists():
+            shutil.rmtree(pristine_dir)
         if ctx.extract_dir.exists():
             shutil.rmtree(ctx.extract_dir)
 
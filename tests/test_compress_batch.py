@@ -0,0 +1,62 @@
+import sys
+import pathlib
+from epub_shrink import _compress_batch
+
+# Stand-in "compressors" so the scaffolding is testable without the real
+# CLI tools: one shrinks every file it is handed, one grows them
+SHRINK_CMD = [sys.executable, "-c",
+              "import sys\nfor p in sys.argv[1:]:\n    open(p, 'wb').write(b'x')"]
+GROW_CMD = [sys.executable, "-c",
+            "import sys\nfor p in sys.argv[1:]:\n    open(p, 'ab').write(b'y' * 4096)"]
+
+
+def _make_images(tmp_path, count=3):
+    paths = []
+    for i in range(count):
+        p = tmp_path / f"img{i}.jpg"
+        p.write_bytes(b"original-payload" * 16)
+        paths.append(p)
+    return paths
+
+
+def test_batch_promotes_smaller_results(tmp_path):
+    paths = _make_images(tmp_path)
+    results = _compress_batch([str(p) for p in paths], SHRINK_CMD, "test-batch-")
+
+    assert len(results) == len(paths)
+    for p, (before, after, error) in zip(paths, results):
+        assert error is None
+        assert after < before
+        assert p.read_bytes() == b"x"
+        assert p.stat().st_size == after
+
+
+def test_batch_keeps_originals_when_result_larger(tmp_path):
+    paths = _make_images(tmp_path)
+    original = paths[0].read_bytes()
+    results = _compress_batch([str(p) for p in paths], GROW_CMD, "test-batch-")
+
+    for p, (before, after, error) in zip(paths, results):
+        assert error is None
+        assert after == before
+        assert p.read_bytes() == original
+
+
+def test_batch_missing_tool_reports_errors(tmp_path):
+    paths = _make_images(tmp_path)
+    original = paths[0].read_bytes()
+    results = _compress_batch([str(p) for p in paths],
+                              ["epub-shrink-no-such-tool"], "test-batch-")
+
+    for p, (before, after, error) in zip(paths, results):
+        assert error is not None
+        assert after == before
+        assert p.read_bytes() == original
+
+
+def test_batch_leaves_no_stray_temp_files(tmp_path):
+    paths = _make_images(tmp_path)
+    _compress_batch([str(p) for p in paths], SHRINK_CMD, "test-batch-")
+
+    leftovers = [p for p in tmp_path.iterdir() if p.name.startswith("tmp")]
+    assert leftovers == []
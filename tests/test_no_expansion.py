@@ -1,23 +1,31 @@
 import pytest
+import random
 import tempfile
 import pathlib
 import shutil
 from PIL import Image
-from epub_shrink import compress_images, EpubContext
+from epub_shrink import compress_images, EpubContext, MIN_COMPRESS_BYTES
+
+def _noise_bytes(n):
+    # Deterministic noise so the fixtures are incompressible but stable
+    return random.Random(0).randbytes(n)
 
 def test_no_expansion_jpeg():
     # Setup mock files
     with tempfile.TemporaryDirectory() as tmpdir:
         root = pathlib.Path(tmpdir)
 
-        # Create a tiny 1x1 JPEG image
+        # Noise at quality=10: large enough to clear the size threshold, and
+        # any re-encode at quality=95 comes out bigger, so the size guard is
+        # the only thing keeping the file from growing
         jpg_path = root / "OEBPS" / "images" / "test.jpg"
         jpg_path.parent.mkdir(parents=True, exist_ok=True)
-        img = Image.new("RGB", (1, 1), color="red")
+        img = Image.frombytes("RGB", (256, 256), _noise_bytes(256 * 256 * 3))
         img.save(jpg_path, format="JPEG", quality=10)
 
         # Get its original size
         original_size = jpg_path.stat().st_size
+        assert original_size >= MIN_COMPRESS_BYTES
 
         # Setup context
         ctx = EpubContext(
@@ -26,7 +34,7 @@ def test_no_expansion_jpeg():
             verbose=True
         )
 
-        # Run compress_images with high quality, which would normally expand a highly-compressed 1x1 image
+        # Run compress_images with high quality, which would normally expand a heavily-compressed image
         jpg_paths = [pathlib.Path("OEBPS") / "images" / "test.jpg"]
         compress_images(ctx, root, 95, jpg_paths, [], [])
 
@@ -41,14 +49,17 @@ def test_no_expansion_png():
     with tempfile.TemporaryDirectory() as tmpdir:
         root = pathlib.Path(tmpdir)
 
-        # Create a tiny 1x1 PNG image
+        # Palette noise saved optimized is already near its size floor, so a
+        # re-encode cannot do better and the guard must keep the original
         png_path = root / "OEBPS" / "images" / "test.png"
         png_path.parent.mkdir(parents=True, exist_ok=True)
-        img = Image.new("RGBA", (1, 1), color="blue")
-        img.save(png_path, format="PNG")
+        img = Image.frombytes("P", (128, 128), _noise_bytes(128 * 128))
+        img.putpalette(random.Random(1).randbytes(768))
+        img.save(png_path, format="PNG", optimize=True)
 
         # Get its original size
         original_size = png_path.stat().st_size
+        assert original_size >= MIN_COMPRESS_BYTES
 
         # Setup context
         ctx = EpubContext(
@@ -66,3 +77,34 @@ def test_no_expansion_png():
 
         # Ensure it did not expand!
         assert after_size <= original_size
+
+def test_below_threshold_left_untouched():
+    # Files under MIN_COMPRESS_BYTES take the skip path and must come out
+    # byte-identical, not merely no larger
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = pathlib.Path(tmpdir)
+
+        jpg_path = root / "OEBPS" / "images" / "tiny.jpg"
+        jpg_path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (1, 1), color="red").save(jpg_path, format="JPEG", quality=10)
+
+        png_path = root / "OEBPS" / "images" / "tiny.png"
+        Image.new("RGBA", (1, 1), color="blue").save(png_path, format="PNG")
+
+        assert jpg_path.stat().st_size < MIN_COMPRESS_BYTES
+        assert png_path.stat().st_size < MIN_COMPRESS_BYTES
+        jpg_bytes = jpg_path.read_bytes()
+        png_bytes = png_path.read_bytes()
+
+        ctx = EpubContext(
+            input_file=pathlib.Path("test.epub"),
+            extract_dir=root,
+            verbose=True
+        )
+
+        jpg_paths = [pathlib.Path("OEBPS") / "images" / "tiny.jpg"]
+        png_paths = [pathlib.Path("OEBPS") / "images" / "tiny.png"]
+        compress_images(ctx, root, 95, jpg_paths, png_paths, [])
+
+        assert jpg_path.read_bytes() == jpg_bytes
+        assert png_path.read_bytes() == png_bytes
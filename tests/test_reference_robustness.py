@@ -1,5 +1,5 @@
 from lxml import etree as ET
-from epub_shrink import EpubContext, remove_unreferenced
+from epub_shrink import EpubContext, extract_stylesheet_refs, remove_unreferenced
 
 def test_reference_robustness(tmp_path):
     ns = {
@@ -156,3 +156,12 @@ def test_reference_robustness(tmp_path):
     assert (content_dir / "images" / "bg.jpg").exists()
     assert (content_dir / "images" / "poster.jpg").exists()
     assert not (content_dir / "images" / "unreferenced.jpg").exists()
+
+
+def test_stylesheet_escaped_url_decoded():
+    # A backslash escape the regex reads literally must still yield the
+    # decoded name alongside the plain regex hits (keep-not-drop)
+    css = r'body { background: url("\66 oo.png"); } h1 { background: url(bar.png); }'
+    refs = extract_stylesheet_refs(css)
+    assert 'foo.png' in refs
+    assert 'bar.png' in refs
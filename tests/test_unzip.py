@@ -0,0 +1,59 @@
+import zipfile
+import pathlib
+from epub_shrink import EpubContext, unzip
+
+
+def _make_epub(path, members):
+    with zipfile.ZipFile(path, "w") as z:
+        for name, data in members:
+            z.writestr(name, data)
+
+
+def test_unzip_extracts_members(tmp_path):
+    # Enough members to exercise the worker pool, not just one thread
+    members = [("mimetype", b"application/epub+zip"),
+               ("META-INF/container.xml", b"<container/>")]
+    for i in range(20):
+        members.append((f"OEBPS/chap{i:02}.xhtml", f"<html>chapter {i}</html>".encode()))
+
+    epub = tmp_path / "book.epub"
+    _make_epub(epub, members)
+    extract_dir = tmp_path / "out"
+    ctx = EpubContext(input_file=epub, extract_dir=extract_dir, verbose=True)
+
+    unzip(ctx)
+
+    for name, data in members:
+        assert (extract_dir / name).read_bytes() == data
+
+
+def test_unzip_skips_default_purged_members(tmp_path):
+    epub = tmp_path / "book.epub"
+    _make_epub(epub, [("mimetype", b"application/epub+zip"),
+                      ("OEBPS/keep.css", b"body {}"),
+                      ("OEBPS/promo.css", b"junk"),
+                      ("com.apple.ibooks.display-options.xml", b"<display/>")])
+    extract_dir = tmp_path / "out"
+    ctx = EpubContext(input_file=epub, extract_dir=extract_dir, verbose=True)
+
+    unzip(ctx)
+
+    assert (extract_dir / "OEBPS" / "keep.css").exists()
+    assert not (extract_dir / "OEBPS" / "promo.css").exists()
+    assert not (extract_dir / "com.apple.ibooks.display-options.xml").exists()
+
+
+def test_unzip_rejects_zip_slip_members(tmp_path):
+    epub = tmp_path / "book.epub"
+    _make_epub(epub, [("mimetype", b"application/epub+zip"),
+                      ("../evil.txt", b"outside"),
+                      ("OEBPS/../../evil2.txt", b"outside")])
+    extract_dir = tmp_path / "out"
+    ctx = EpubContext(input_file=epub, extract_dir=extract_dir, verbose=True)
+
+    unzip(ctx)
+
+    assert (extract_dir / "mimetype").exists()
+    # Nothing may land outside the extraction directory
+    assert not (tmp_path / "evil.txt").exists()
+    assert not (tmp_path / "evil2.txt").exists()